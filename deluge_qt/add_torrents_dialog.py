@@ -303,6 +303,8 @@ class TorrentFileModel(FileModel):
 
     class Item(FileModel.Item):
 
+        __slots__ = ()
+
         @property
         def checkState(self):
             if self.is_file():
@@ -1,9 +1,11 @@
 
 import sys
+import time
 import functools
 import logging
 
 import sip
+from PyQt4 import QtCore
 from twisted.internet import defer
 
 log = logging.getLogger(__name__)
@@ -29,3 +31,124 @@ def g_proxy(self, *args, **kwargs):
         g.close()
 
     return defer.inlineCallbacks(functools.wraps(func)(g_proxy))
+
+
+class Flight(object):
+    """Bookkeeping of a single_flight method for one object."""
+
+    def __init__(self):
+        self.active = False
+        self.pending = False # called again while active, another call is due on completion
+        self.merged = 0 # calls merged into an active or a follow-up call
+        self.dropped = 0 # responses dropped because the context changed
+        self.latency = None # smoothed call duration in seconds
+        self.generation = 0 # bumped by flight_reset(), responses of older calls are dropped
+
+
+def flight(obj, name="update"):
+    """Return Flight of the single_flight method of obj."""
+    return obj.__dict__.setdefault("_flights", {}).setdefault(name, Flight())
+
+
+def flight_reset(obj):
+    """Forget the calls in flight of all single_flight methods of obj. To be called from component stop():
+       requests outstanding when the daemon connection drops are never answered, and would block the methods
+       for good otherwise."""
+    for state in obj.__dict__.get("_flights", {}).itervalues():
+        state.generation += 1
+        state.active = False
+        state.pending = False
+
+
+def single_flight(context=None):
+    """Decorator for periodic update() methods written in inlineCallbacks style (implies inlineCallbacks).
+
+       At most one call per object is outstanding: a call made while the previous one is in flight is merged into
+       a single follow-up call made when it completes, so a slow daemon is polled no faster than it can answer.
+       context is the name of the attribute the request depends on (filter, torrent_ids); if it changes while
+       a request is in flight, the response is dropped and the call is repeated for the new value."""
+
+    def decorator(func):
+
+        def g_proxy(self, state, *args, **kwargs):
+            generation = state.generation
+            initial_context = getattr(self, context) if context else None
+            g = func(self, *args, **kwargs)
+            result = exc_info = None
+            try:
+                while not sip.isdeleted(self):
+                    try:
+                        if exc_info:
+                            request = g.throw(*exc_info)
+                        else:
+                            request = g.send(result)
+                    except StopIteration:
+                        break
+                    result = exc_info = None
+                    try:
+                        result = yield request
+                    except Exception:
+                        exc_info = sys.exc_info()
+                    if state.generation != generation:
+                        state.dropped += 1
+                        break
+                    if context and not sip.isdeleted(self) and getattr(self, context) != initial_context:
+                        state.dropped += 1
+                        state.pending = True
+                        break
+            finally:
+                g.close()
+
+        g_proxy = defer.inlineCallbacks(g_proxy)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            state = flight(self, func.__name__)
+            if state.active:
+                state.pending = True
+                state.merged += 1
+                return defer.succeed(None)
+
+            def landed(result):
+                if state.generation != generation: # reset while in flight, a newer call may own the state
+                    return result
+                elapsed = time.time() - started
+                state.latency = elapsed if state.latency is None else 0.75 * state.latency + 0.25 * elapsed
+                state.active = False
+                if state.pending and not sip.isdeleted(self):
+                    wrapper(self, *args, **kwargs)
+                return result
+
+            state.active = True
+            state.pending = False
+            generation = state.generation
+            started = time.time()
+            return g_proxy(self, state, *args, **kwargs).addBoth(landed)
+
+        return wrapper
+
+    return decorator
+
+
+class Coalescer(QtCore.QObject):
+    """Callable that collapses bursts of calls into a single call of the target at the end of a time window (ms).
+       Call arguments are ignored, which makes it usable as a deluge event handler."""
+
+    def __init__(self, target, window=0, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.target = target
+        self.merged = 0 # number of calls absorbed by an already scheduled one
+        self._timer = QtCore.QTimer(self, singleShot=True, interval=window, timeout=self._fire)
+
+    def __call__(self, *args):
+        if self._timer.isActive():
+            self.merged += 1
+        else:
+            self._timer.start()
+
+    def setWindow(self, window):
+        self._timer.setInterval(window)
+
+    @QtCore.pyqtSlot()
+    def _fire(self):
+        self.target()
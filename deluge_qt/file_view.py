@@ -29,6 +29,10 @@
 #    statement from all source files in the program, then also delete it here.
 #
 
+import logging
+import operator
+from itertools import compress, count, imap
+
 from PyQt4 import QtCore, QtGui
 from twisted.internet import defer
 
@@ -38,6 +42,10 @@
 
 from .ui_tools import ProgressBarDelegate, HeightFixItemDelegate, IconLoader, HeaderActionList, context_menu_pos
 from .ui_common import FileModel, Column
+from .async_tools import single_flight, flight_reset
+from .lang_tools import LRUCache
+
+log = logging.getLogger(__name__)
 
 
 class FileViewModel(FileModel):
@@ -48,22 +56,32 @@ class FileViewModel(FileModel):
                        2: IconLoader.themeIcon("go-up"),
                        5: IconLoader.themeIcon("go-top")}
 
+    lazy_threshold = 5000
+
     class Item(FileModel.Item):
 
+        __slots__ = ()
+
         @property
         def progress(self):
             if self.is_file():
                 return self.model.progress[self.index]
             else:
-                return sum(child.progress for child in self.children) / len(self.children)
+                return self.aggregate("progress")
 
         @property
         def priority(self):
             if self.is_file():
                 return self.model.priorities[self.index]
             else:
-                if len(frozenset(child.priority for child in self.children)) == 1:
-                    return self.children[0].priority
+                return self.aggregate("priority")
+
+        def _aggregate_progress(self, values):
+            return sum(values) / len(values) if values else 0.
+
+        def _aggregate_priority(self, values):
+            if len(frozenset(values)) == 1:
+                return values[0]
 
     def __init__(self, files, parent):
         FileModel.__init__(self, parent)
@@ -80,27 +98,72 @@ def _create_columns(self):
                     Column("Priority", text=(fprio, "priority"), icon=(self._priority_icons.get, "priority"), width=12)]
         return columns
 
-    def update(self, progress, priorities):
-        if self.progress != progress or self.priorities != priorities:
-            self.progress = progress
-            self.priorities = priorities
+    def file_value(self, field, index):
+        if field == "progress":
+            return self.progress[index]
+        if field == "priority":
+            return self.priorities[index]
+        return FileModel.file_value(self, field, index)
 
-            active_range = self.columnsForFields(["progress", "priority"])
-            active_range = min(active_range), max(active_range)
-            self.dataChanged.emit(self.index(0, active_range[0]),
-                                  self.index(len(self.root.children) - 1, active_range[1]))
+    def update(self, progress, priorities):
+        changed_progress = self._changed_files(self.progress, progress)
+        changed_priorities = self._changed_files(self.priorities, priorities)
+        self.progress = progress
+        self.priorities = priorities
+        self._files_changed("progress", changed_progress)
+        self._files_changed("priority", changed_priorities)
+
+    @staticmethod
+    def _changed_files(old_values, new_values):
+        # indexes of files whose value differs; both the equality test and the scan run in C
+        if old_values == new_values:
+            return []
+        return list(compress(count(), imap(operator.ne, old_values, new_values)))
+
+    def _files_changed(self, field, indexes):
+        # Drop cached field values of the folders above changed files and repaint only the affected rows,
+        # one dataChanged batch per parent.
+        if not indexes:
+            return
+
+        rows = {} # parent item => rows of changed children
+        file_items = self.file_items
+        for i in indexes:
+            item = file_items[i]
+            if item is None: # lazy mode, the change shows in the pending folder that holds the file
+                item = self._pending_folder(i)
+                item.aggregates.pop(field, None)
+            while item.parent:
+                parent_rows = rows.setdefault(item.parent, set())
+                if item.row() in parent_rows:
+                    break # the rest of the branch is already marked
+                parent_rows.add(item.row())
+                item.parent.aggregates.pop(field, None)
+                item = item.parent
+
+        columns = self.columnsForFields([field])
+        left, right = columns[0], columns[-1]
+        for parent, parent_rows in rows.iteritems():
+            parent_index = self.createIndex(parent.row(), 0, parent) if parent is not self.root else self.INVALID_INDEX
+            self._emitDataChanged([(row, left, right) for row in parent_rows], parent_index)
 
 
 class FileView(QtGui.QTreeView, component.Component):
 
     EMPTY_MODEL = FileViewModel([], None)
 
+    # Models of recently selected torrents are kept for instant switching, within these limits
+    cached_models = 20
+    cached_models_size = 64 << 20
+
     def __init__(self, parent=None):
         QtGui.QTreeWidget.__init__(self, parent)
         component.Component.__init__(self, "FileView", interval=2)
 
         self.torrent_ids = []
-        self.file_models = {}
+        # the model on display is never evicted, whatever other torrents' events promote
+        self.file_models = LRUCache(self.cached_models, self.cached_models_size, FileViewModel.estimated_size,
+                                    self._model_evicted, lambda model: model is self.model())
 
         self.setModel(self.EMPTY_MODEL)
         self.model().resize_header(self.header())
@@ -114,10 +177,15 @@ def __init__(self, parent=None):
 
         HeaderActionList(self)
 
+    def _model_evicted(self, model):
+        log.debug("Dropped file model, cache stats: %s", self.file_models.stats())
+        model.deleteLater() # parented to the view, would stay alive otherwise
+
     def start(self):
         pass
 
     def stop(self):
+        flight_reset(self)
         self.setModel(self.EMPTY_MODEL)
         self.file_models.clear()
         self.torrent_ids = []
@@ -126,7 +194,7 @@ def showEvent(self, event):
         self.update()
         QtGui.QTreeView.showEvent(self, event)
 
-    @defer.inlineCallbacks
+    @single_flight("torrent_ids")
     def update(self):
         if self.torrent_ids and self.isVisible():
             fields = ["compact", "file_progress", "file_priorities"]
@@ -135,7 +203,7 @@ def update(self):
             if not model:
                 fields.append("files")
 
-            status = yield component.get("SessionProxy").get_torrent_status(self.torrent_ids[0], fields)
+            status = yield component.get("StatusBroker").get_torrent_status(self.torrent_ids[0], fields)
             if not model:
                 self.file_models[self.torrent_ids[0]] = model = FileViewModel(status["files"], self)
                 model.filesRenamed.connect(self.on_model_filesRenamed)
@@ -185,7 +253,11 @@ def on_client_torrentFolderRenamed(self, torrent_id, old_name, new_name):
             model.renameFolder(old_name, new_name)
 
     def on_client_torrentRemoved(self, torrent_id):
-        self.file_models.pop(torrent_id, None)
+        model = self.file_models.pop(torrent_id)
+        if model is not None:
+            if self.model() is model:
+                self.setModel(self.EMPTY_MODEL)
+            model.deleteLater() # parented to the view, would stay alive otherwise
 
     @QtCore.pyqtSlot(object)
     def set_torrent_ids(self, torrent_ids):
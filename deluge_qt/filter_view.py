@@ -29,6 +29,8 @@
 #    statement from all source files in the program, then also delete it here.
 #
 
+import time
+
 import sip
 from PyQt4 import QtGui, QtCore
 from twisted.internet import defer
@@ -113,10 +115,67 @@ def update(self, values):
             self.addChildren(new_items)
 
 
+class FilterCounts(object):
+    """Filter tree counts (as returned by core.get_filter_tree) of the given categories,
+       maintained incrementally from TorrentViewModel deltas."""
+
+    # fetched for every torrent just to count the Active state, so only when it is shown
+    rate_fields = ("download_payload_rate", "upload_payload_rate")
+
+    def __init__(self, cats, count_active=False):
+        self.cats = tuple(cats)
+        self.count_active = count_active
+        self.fields = frozenset(self.cats + self.rate_fields if count_active else self.cats)
+        self.clear()
+
+    def clear(self):
+        self.counts = dict((cat, {}) for cat in self.cats) # cat => {value => count}
+        self.total = 0
+        self.active = 0
+
+    def add(self, item, sign=1):
+        self.total += sign
+        for cat in self.cats:
+            values = self.counts[cat]
+            value = item.get(cat) # None until the field is fetched
+            count = values.get(value, 0) + sign
+            if count:
+                values[value] = count
+            else:
+                del values[value]
+        if self.count_active and (item.get("download_payload_rate") or item.get("upload_payload_rate")):
+            self.active += sign
+
+    def remove(self, item):
+        self.add(item, -1)
+
+    def complete(self):
+        return all(None not in values for values in self.counts.itervalues())
+
+    def count(self, cat, value):
+        """Client-side count of a filter tree entry, None if it can only be had from the daemon."""
+        if cat not in self.counts or (cat == "tracker_host" and value == "Error"):
+            return None
+        if value == "All":
+            return self.total
+        if cat == "state" and value == "Active":
+            return self.active if self.count_active else None
+        return self.counts[cat].get(value, 0)
+
+
 class FilterView(QtGui.QTreeWidget, component.Component):
 
     filter_changed = QtCore.pyqtSignal(object)
 
+    # With sidebar_client_counts, counts of these categories are derived from the torrent status TorrentView
+    # already polls, whenever it holds every torrent (no filter selected). get_filter_tree is then polled
+    # only every full_poll_interval seconds, for zero-count values, tracker errors and other categories.
+    counted_cats = ("state", "tracker_host", "label")
+    full_poll_interval = 30
+
+    # categories whose zero-count values the daemon omits unless sidebar_show_zero is set
+    zero_hidden_cats = ("state", "owner", "tracker_host")
+
     def __init__(self, parent=None):
         QtGui.QTreeWidget.__init__(self, parent)
         component.Component.__init__(self, "FilterView", interval=2)
@@ -125,21 +184,89 @@ def __init__(self, parent=None):
 
         self.items_by_cat = {}
         self.filters = {}
+        self.polled_filters = {}
+        self._poll_args = None
+        self._poll_time = 0
 
         self.ui_config = configmanager.ConfigManager("qtui.conf")
 
         self.itemSelectionChanged.connect(self.on_itemSelectionChanged)
 
+    def start(self):
+        component.get("TorrentView").model().countsChanged.connect(self._counts_changed)
+
     def stop(self):
+        torrent_model = component.get("TorrentView").model()
+        torrent_model.countsChanged.disconnect(self._counts_changed)
+        torrent_model.set_filter_counts(None)
         self.clear()
         self.items_by_cat = {}
         self.filters = {}
+        self.polled_filters = {}
+        self._poll_args = None
+
+    def _filter_counts(self):
+        """Installed FilterCounts, if they currently reflect every torrent."""
+        torrent_view = component.get("TorrentView")
+        counts = torrent_view.model().filter_counts
+        if counts is not None and torrent_view.loaded_filter == {} and counts.complete():
+            return counts
+
+    def _install_counts(self):
+        cats = ()
+        if self.ui_config["sidebar_client_counts"]:
+            cats = tuple(cat for cat in self.counted_cats if cat in self.polled_filters)
+        count_active = "state" in cats and any(value == "Active" for value, count in self.polled_filters["state"])
+        torrent_model = component.get("TorrentView").model()
+        current = torrent_model.filter_counts
+        current_setup = (current.cats, current.count_active) if current is not None else ((), False)
+        if current_setup != (cats, count_active):
+            torrent_model.set_filter_counts(FilterCounts(cats, count_active) if cats else None)
+
+    def _derived_filters(self, counts):
+        show_zero = self.ui_config["sidebar_show_zero"]
+        filters = {}
+        for cat, values in self.polled_filters.iteritems():
+            if cat not in counts.counts:
+                filters[cat] = values
+                continue
+            derived = []
+            for value, count in values:
+                value_count = counts.count(cat, value)
+                if value_count is None:
+                    value_count = count
+                if value_count or show_zero or value == "All" or cat not in self.zero_hidden_cats:
+                    derived.append((value, value_count))
+            polled = frozenset(value for value, count in values)
+            derived.extend(sorted(item for item in counts.counts[cat].iteritems() if item[0] not in polled))
+            filters[cat] = derived
+        return filters
+
+    @QtCore.pyqtSlot()
+    def _counts_changed(self):
+        counts = self._filter_counts()
+        if counts is not None and self.polled_filters:
+            self._set_filters(self._derived_filters(counts))
 
     @defer.inlineCallbacks
     def update(self):
         hide_cat = [] if self.ui_config["sidebar_show_trackers"] else ["tracker_host"]
-        filters = yield client.core.get_filter_tree(self.ui_config["sidebar_show_zero"], hide_cat)
+        poll_args = (self.ui_config["sidebar_show_zero"], hide_cat)
+
+        counts = self._filter_counts()
+        if counts is None or poll_args != self._poll_args or time.time() - self._poll_time > self.full_poll_interval:
+            self.polled_filters = yield client.core.get_filter_tree(*poll_args)
+            self._poll_args = poll_args
+            self._poll_time = time.time()
+            self._install_counts()
+            counts = self._filter_counts()
+
+        if counts is not None:
+            self._set_filters(self._derived_filters(counts))
+        else:
+            self._set_filters(self.polled_filters)
 
+    def _set_filters(self, filters):
         if self.filters == filters:
             return
 
@@ -30,6 +30,7 @@
 #
 
 import functools
+import collections
 
 
 def memoize(f):
@@ -46,3 +47,121 @@ def wrapped(*args):
             return value
 
     return wrapped
+
+
+_missing = object()
+
+def lru_memoize(maxsize):
+    """Memoizer for single argument functions with the cache bounded by maxsize entries.
+       LRU is approximated with two generations: when the current generation fills up it replaces the previous one,
+       so entries not used for a whole generation are dropped."""
+
+    def decorator(f):
+        generations = [{}, {}] # current, previous
+        limit = max(maxsize // 2, 1)
+
+        @functools.wraps(f)
+        def wrapped(arg):
+            current = generations[0]
+            value = current.get(arg, _missing)
+            if value is _missing:
+                value = generations[1].pop(arg, _missing)
+                if value is _missing:
+                    value = f(arg)
+                if len(current) >= limit:
+                    generations[:] = [{}, current]
+                    current = generations[0]
+                current[arg] = value
+            return value
+
+        def cache_clear():
+            generations[:] = [{}, {}]
+
+        wrapped.cache_clear = cache_clear
+        return wrapped
+
+    return decorator
+
+
+class LRUCache(object):
+    """Mapping bounded by max_count entries and, optionally, max_size total bytes as estimated by sizeof(value).
+       Least recently used entries (lookups count as use) are evicted and passed to on_evict, as are the entries
+       dropped by clear(); pop() hands the value back to the caller instead. The most recent entry and entries
+       for which pinned(value) is true are never evicted, even if they alone exceed the limits."""
+
+    def __init__(self, max_count, max_size=None, sizeof=None, on_evict=None, pinned=None):
+        self.max_count = max_count
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 0)
+        self.on_evict = on_evict
+        self.pinned = pinned
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = collections.OrderedDict() # key => (value, size), least recently used first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        try:
+            value, size = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        # values may grow while in use (lazily built trees), so measure again
+        new_size = self.sizeof(value)
+        self._entries[key] = value, new_size
+        self.size += new_size - size
+        self._evict()
+        return value
+
+    def __setitem__(self, key, value):
+        self.pop(key, None)
+        size = self.sizeof(value)
+        self._entries[key] = value, size
+        self.size += size
+        self._evict()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, default=None):
+        try:
+            value, size = self._entries.pop(key)
+        except KeyError:
+            return default
+        self.size -= size
+        return value
+
+    def clear(self):
+        entries = self._entries.values()
+        self._entries.clear()
+        self.size = 0
+        if self.on_evict:
+            for value, size in entries:
+                self.on_evict(value)
+
+    def stats(self):
+        return {"count": len(self._entries), "size": self.size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+    def _evict(self):
+        entries = self._entries
+        for key in entries.keys()[:-1]: # least recently used first, never the newest
+            if len(entries) <= self.max_count and (self.max_size is None or self.size <= self.max_size):
+                break
+            value, size = entries[key]
+            if self.pinned and self.pinned(value):
+                continue
+            del entries[key]
+            self.size -= size
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(value)
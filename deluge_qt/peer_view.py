@@ -32,44 +32,138 @@
 
 import socket
 import logging
+from collections import deque
 
 from PyQt4 import QtCore, QtGui
 from twisted.python.compat import inet_pton
-from twisted.internet import defer
 
 import deluge.common
 from deluge.ui.countries import COUNTRIES
 from deluge import component
 
-from .lang_tools import memoize
+from .lang_tools import memoize, lru_memoize
 from .ui_tools import ProgressBarDelegate, HeightFixItemDelegate, IconLoader
 from .ui_common import DictModel, Column
+from .async_tools import single_flight, flight_reset
 
 log = logging.getLogger(__name__)
 
 
+@lru_memoize(8192)
+def ip_sort_key(ip):
+    """Sort key for "address:port" peer strings: (address family, packed address, numeric port).
+       Unparsable strings sort after all valid addresses."""
+    addr, _sep, port = ip.rpartition(":")
+    addr = addr.strip("[]")
+    try:
+        family = socket.AF_INET6 if ":" in addr else socket.AF_INET
+        return (0, family, inet_pton(family, addr), int(port))
+    except (socket.error, ValueError):
+        return (1, ip)
+
+
+class PeerStats(object):
+    """Per-client and per-country peer aggregates (peer count, total rates, average progress).
+
+       Maintained incrementally from model deltas: a peer's old values are subtracted before a change
+       and its new values are added after. tick() records the group rates into a short rolling history."""
+
+    kinds = ("client", "country")
+    history_length = 30 # ticks, one per PeerView update
+
+    def __init__(self):
+        self.groups = {} # (kind, name) => [peers, down_speed, up_speed, progress_sum]
+        self.history = {} # (kind, name) => deque([(down_speed, up_speed)])
+
+    def add(self, peer, sign=1):
+        for kind in self.kinds:
+            key = (kind, peer.get(kind) or "")
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = [0, 0, 0, 0.]
+            group[0] += sign
+            if group[0] == 0:
+                del self.groups[key] # drop the float residue along with the group
+                continue
+            group[1] += sign * peer["down_speed"]
+            group[2] += sign * peer["up_speed"]
+            group[3] += sign * peer["progress"]
+
+    def remove(self, peer):
+        self.add(peer, -1)
+
+    def tick(self):
+        for key in list(self.history):
+            if key not in self.groups:
+                del self.history[key]
+        for key, (peers, down_speed, up_speed, progress_sum) in self.groups.iteritems():
+            history = self.history.get(key)
+            if history is None:
+                history = self.history[key] = deque(maxlen=self.history_length)
+            history.append((down_speed, up_speed))
+
+    def clear_history(self):
+        self.history = {}
+
+    def summary(self):
+        """Aggregates as DictModel items, keyed by (kind, name)."""
+        result = {}
+        for key, (peers, down_speed, up_speed, progress_sum) in self.groups.iteritems():
+            history = self.history.get(key) or [(down_speed, up_speed)]
+            result[key] = {"kind": key[0], "name": key[1], "peers": peers,
+                           "down_speed": down_speed, "up_speed": up_speed, "progress": progress_sum / peers,
+                           "avg_down_speed": float(sum(h[0] for h in history)) / len(history),
+                           "avg_up_speed": float(sum(h[1] for h in history)) / len(history)}
+        return result
+
+
 class PeerViewModel(DictModel):
 
+    # peers churn every update, relayouts would keep resetting the view
+    bulk_add_fraction = None
+
+    observed_fields = frozenset(("client", "country", "down_speed", "up_speed", "progress"))
+
+    statsChanged = QtCore.pyqtSignal()
+
+    def _clear(self):
+        DictModel._clear(self)
+        self.stats = PeerStats()
+
+    def clear(self):
+        DictModel.clear(self)
+        self.statsChanged.emit()
+
+    def _observeItem(self, old_item, new_item):
+        if old_item is not None:
+            self.stats.remove(old_item)
+        if new_item is not None:
+            self.stats.add(new_item)
+
+    def apply_delta(self, added=None, removed=None, changed=None):
+        DictModel.apply_delta(self, added, removed, changed)
+        self.stats.tick()
+        self.statsChanged.emit()
+
     def _create_columns(self):
+        flags = IconLoader.flagIcons() # loaded here, not in the paint path
+
         @memoize
         def flag_icon(country):
+            if country and flags is not None:
+                return flags.get(country.lower())
             try:
                 if country:
                     return IconLoader.packageIcon("data/pixmaps/flags/%s.png" % country.lower())
             except Exception:
                 log.debug("Unable to load flag: %s", exc_info=True)
 
-        def ip_sort_key(ip):
-            addr, port = ip.rsplit(':', 1)
-            addr = inet_pton(socket.AF_INET6 if ':' in addr else socket.AF_INET, addr)
-            return (addr, port)
-
         peer_icon = IconLoader.customIcon("downloading16.png")
         seed_icon = IconLoader.customIcon("seeding16.png")
 
         return [Column("", icon=(flag_icon, "country"), toolTip=(COUNTRIES.get, "country"), sort="country", width=3),
                 Column("Address", text="ip", icon=(lambda flag: seed_icon if flag else peer_icon, "seed"),
-                       sort=(ip_sort_key, "total_wanted"), width=20),
+                       sort=(ip_sort_key, "ip"), width=20),
                 Column("Client", text="client", sort="client", width=15),
                 Column("Progress", text=(deluge.common.fpcnt, "progress"), user="progress", sort="progress", width=15),
                 Column("Down Speed", text=(deluge.common.fspeed, "down_speed"), sort="down_speed", width=10),
@@ -91,16 +185,17 @@ def __init__(self, parent=None):
         self.setItemDelegateForColumn(3, ProgressBarDelegate(self))
 
     def stop(self):
+        flight_reset(self)
         self.model().clear()
 
     def showEvent(self, event):
         self.update()
         QtGui.QTreeView.showEvent(self, event)
 
-    @defer.inlineCallbacks
+    @single_flight("torrent_ids")
     def update(self):
         if self.torrent_ids and self.isVisible():
-            status = (yield component.get("SessionProxy").get_torrent_status(self.torrent_ids[0], ["peers"]))
+            status = (yield component.get("StatusBroker").get_torrent_status(self.torrent_ids[0], ["peers"]))
             peers = dict((peer["ip"], peer) for peer in status["peers"])
             self.model().update(peers)
 
@@ -108,7 +203,63 @@ def update(self):
     def set_torrent_ids(self, torrent_ids):
         if self.torrent_ids != torrent_ids:
             self.torrent_ids = torrent_ids
+            self.model().stats.clear_history()
             if torrent_ids:
                 self.update()
             else:
                 self.model().clear()
+
+
+class PeerStatsModel(DictModel):
+
+    def _create_columns(self):
+        kind_names = {"client": "Client", "country": "Country"}
+
+        def group_name(kind, name):
+            if kind == "country":
+                return COUNTRIES.get(name, name)
+            return name
+
+        return [Column("Group", text=(lambda kind: _(kind_names[kind]), "kind"), sort="kind", width=8),
+                Column("Name", text=(group_name, "kind", "name"), sort="name", width=15),
+                Column("Peers", text="peers", sort="peers", width=6),
+                Column("Progress", text=(deluge.common.fpcnt, "progress"), sort="progress", width=10),
+                Column("Down Speed", text=(deluge.common.fspeed, "down_speed"), sort="down_speed", width=10),
+                Column("Up Speed", text=(deluge.common.fspeed, "up_speed"), sort="up_speed", width=10),
+                Column("Avg Down Speed", text=(deluge.common.fspeed, "avg_down_speed"), sort="avg_down_speed",
+                       width=10),
+                Column("Avg Up Speed", text=(deluge.common.fspeed, "avg_up_speed"), sort="avg_up_speed", width=10)]
+
+
+class PeerStatsView(QtGui.QTreeView):
+    """Summary pane for PeerView: aggregates peers by client and by country.
+       Refreshed from the source model's stats, only while the pane is actually on screen."""
+
+    def __init__(self, parent=None):
+        QtGui.QTreeView.__init__(self, parent)
+
+        self.source_model = None
+
+        self.setModel(PeerStatsModel(self))
+        self.model().resize_header(self.header())
+
+        HeightFixItemDelegate.install(self)
+
+    def setSourceModel(self, model):
+        self.source_model = model
+        model.statsChanged.connect(self.refresh)
+        self.refresh()
+
+    def showEvent(self, event):
+        self.refresh()
+        QtGui.QTreeView.showEvent(self, event)
+
+    def resizeEvent(self, event):
+        QtGui.QTreeView.resizeEvent(self, event)
+        if event.oldSize().height() <= 0: # expanded from the collapsed state
+            self.refresh()
+
+    @QtCore.pyqtSlot()
+    def refresh(self):
+        if self.source_model is not None and self.isVisible() and not self.visibleRegion().isEmpty():
+            self.model().update(self.source_model.stats.summary())
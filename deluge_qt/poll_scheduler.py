@@ -0,0 +1,125 @@
+#
+# poll_scheduler.py
+#
+# Copyright (C) 2010 Nikita Nemkin <nikita@nemkin.ru>
+#
+# This file is part of Deluge.
+#
+# Deluge is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Deluge. If not, see <http://www.gnu.org/licenses/>.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import time
+import logging
+
+from PyQt4 import QtGui, QtCore
+
+from deluge import component
+
+log = logging.getLogger(__name__)
+
+
+class PollScheduler(QtCore.QObject, component.Component):
+    """Stretches update intervals of polling components that are hidden or idle.
+
+       A component is hidden when none of its polled widgets (component.polled_widgets() or the component itself)
+       is on screen. The session is idle when neither the user nor the torrent list did anything for idle_timeout
+       seconds. Intervals return to normal (with an immediate update) as soon as the condition clears."""
+
+    hidden_factor = 5
+    idle_factor = 3
+    idle_timeout = 60
+
+    polled_components = ["MainWindow", "StatusBar", "FilterView", "TorrentView",
+                         "TorrentDetails", "PeerView", "FileView", "TorrentOptions"]
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        component.Component.__init__(self, "PollScheduler", interval=1)
+
+        self.factors = {} # component name => current interval multiplier
+        self._last_activity = time.time()
+        self._activity_mark = None
+
+        QtGui.qApp.focusChanged.connect(self._focus_changed)
+
+    def effective_interval(self, name):
+        return component.get(name)._component_interval * self.factors.get(name, 1)
+
+    def rates(self):
+        """Current polling rates (updates per second) of the managed components, for diagnostics."""
+        return dict((name, 1. / self.effective_interval(name)) for name, comp in self._components())
+
+    def _components(self):
+        for name in self.polled_components:
+            try:
+                yield name, component.get(name)
+            except KeyError:
+                pass
+
+    def _is_visible(self, comp):
+        widgets = comp.polled_widgets() if hasattr(comp, "polled_widgets") else [comp]
+        for widget in widgets:
+            if widget.isVisible() and not widget.window().isMinimized() and not widget.visibleRegion().isEmpty():
+                return True
+        return False
+
+    def _set_factor(self, name, comp, factor):
+        old_factor = self.factors.get(name, 1)
+        if factor != old_factor:
+            log.debug("%s polling interval x%d", name, factor)
+            self.factors[name] = factor
+
+        # reapply every tick: pause/resume restarts the timer with the nominal interval
+        timer = getattr(comp, "_component_timer", None)
+        if timer and timer.running:
+            timer.interval = comp._component_interval * factor
+            if factor < old_factor:
+                comp.update()
+
+    def update(self):
+        now = time.time()
+
+        # cursor movement and torrent list changes count as activity; focus changes are caught by the slot
+        try:
+            revision = component.get("TorrentView").model().revision
+        except KeyError:
+            revision = None
+        mark = (QtGui.QCursor.pos(), revision)
+        if mark != self._activity_mark:
+            self._activity_mark = mark
+            self._last_activity = now
+        idle = now - self._last_activity > self.idle_timeout
+
+        for name, comp in self._components():
+            factor = self.hidden_factor if not self._is_visible(comp) else 1
+            if idle:
+                factor = max(factor, self.idle_factor)
+            self._set_factor(name, comp, factor)
+
+    @QtCore.pyqtSlot()
+    def _focus_changed(self):
+        was_idle = time.time() - self._last_activity > self.idle_timeout
+        self._last_activity = time.time()
+        if was_idle:
+            self.update()
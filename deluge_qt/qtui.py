@@ -75,6 +75,7 @@ class QtUI(object):
         "show_rate_in_title": False,
         "sidebar_show_zero": False,
         "sidebar_show_trackers": True,
+        "sidebar_client_counts": True,
         "choose_directory_dialog_path": "",
     }
 
@@ -102,6 +103,7 @@ def __init__(self, args):
         from .connection_manager import ConnectionManager
         from .main_window import MainWindow
         from .plugin_manager import PluginManager
+        from .poll_scheduler import PollScheduler
 
         TrackerIcons()
         SessionProxy()
@@ -109,6 +111,7 @@ def __init__(self, args):
         connection_manager = ConnectionManager()
         main_window = MainWindow()
         main_window.show()
+        PollScheduler()
 
         app.aboutToQuit.connect(self.on_quit)
         reactor.callLater(0, connection_manager.first_time)
@@ -39,6 +39,7 @@
 
 import formats
 from .generated.ui import Ui_TorrentDetails
+from .async_tools import single_flight, flight_reset, Coalescer
 
 log = logging.getLogger(__name__)
 
@@ -71,6 +72,48 @@ def setVisible(self, visible):
             self.action.setChecked(visible)
 
 
+class StatusBroker(QtCore.QObject, component.Component):
+    """Merges status requests issued by the detail panes within batch_window (ms) into one SessionProxy call
+       per torrent with the union of requested fields. Every requester receives only the fields it asked for."""
+
+    batch_window = 20
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        component.Component.__init__(self, "StatusBroker")
+
+        self.requests = 0 # get_torrent_status calls served
+        self.round_trips = 0 # SessionProxy calls made for them
+        self._pending = {} # torrent_id => [(fields, deferred)]
+        self._flush = Coalescer(self._send, self.batch_window, self)
+
+    def get_torrent_status(self, torrent_id, fields):
+        d = defer.Deferred()
+        self._pending.setdefault(torrent_id, []).append((fields, d))
+        self._flush()
+        return d
+
+    def _send(self):
+        pending, self._pending = self._pending, {}
+        for torrent_id, requesters in pending.iteritems():
+            fields = set()
+            for requester_fields, d in requesters:
+                fields.update(requester_fields)
+            self.requests += len(requesters)
+            self.round_trips += 1
+
+            d = component.get("SessionProxy").get_torrent_status(torrent_id, list(fields))
+            d.addCallbacks(self._fan_out, self._fan_out_error, callbackArgs=(requesters,), errbackArgs=(requesters,))
+
+    def _fan_out(self, status, requesters):
+        for fields, d in requesters:
+            d.callback(dict((field, status[field]) for field in fields if field in status))
+
+    def _fan_out_error(self, failure, requesters):
+        for fields, d in requesters:
+            d.errback(failure)
+
+
 class TorrentDetails(QtGui.QTabWidget, Ui_TorrentDetails, component.Component):
 
     def __init__(self, parent=None):
@@ -78,9 +121,15 @@ def __init__(self, parent=None):
         Ui_TorrentDetails.__init__(self)
         component.Component.__init__(self, "TorrentDetails", interval=2)
 
+        self.status_broker = StatusBroker(self) # shared by all detail panes, must exist before they are created
         self.setupUi(self)
         self.progress_bar.setText("")
 
+        # peer summary pane starts collapsed, the main window restores the saved splitter state afterwards
+        self.tree_peer_stats.setSourceModel(self.tree_peers.model())
+        self.splitter_peers.setCollapsible(0, False)
+        self.splitter_peers.setSizes([1, 0])
+
         self.tab_proxies = [TabProxy(self, i) for i in xrange(self.count())]
         self.tabBar().setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
         self.tabBar().addActions([tab.action for tab in self.tab_proxies])
@@ -128,13 +177,17 @@ def set_torrent_ids(self, torrent_ids):
             else:
                 self._clear()
 
+    def polled_widgets(self):
+        return [self.tab_status, self.tab_details]
+
     def stop(self):
+        flight_reset(self)
         self._clear()
 
-    @defer.inlineCallbacks
+    @single_flight("torrent_ids")
     def update(self):
         if self.torrent_ids:
-            status = yield component.get("SessionProxy").get_torrent_status(self.torrent_ids[0], self.fields)
+            status = yield component.get("StatusBroker").get_torrent_status(self.torrent_ids[0], self.fields)
 
             if self.status == status:
                 return
@@ -38,6 +38,7 @@
 
 from .generated.ui import Ui_TorrentOptions, Ui_EditTackersDialog, Ui_AddTrackersDialog
 from .ui_common import WidgetLoader
+from .async_tools import single_flight, flight_reset
 
 
 class TorrentOptions(QtGui.QWidget, Ui_TorrentOptions, component.Component):
@@ -59,16 +60,17 @@ def start(self):
         self.setEnabled(True)
 
     def stop(self):
+        flight_reset(self)
         self.setEnabled(False)
 
     def showEvent(self, event):
         self.update()
         QtGui.QWidget.showEvent(self, event)
 
-    @defer.inlineCallbacks
+    @single_flight("torrent_ids")
     def update(self):
         if self.torrent_ids and self.isVisible():
-            options = yield component.get("SessionProxy").get_torrent_status(self.torrent_ids[0], self._option_keys)
+            options = yield component.get("StatusBroker").get_torrent_status(self.torrent_ids[0], self._option_keys)
             if options != self.options:
                 modified_options = dict((key, value) for key, value in options.iteritems() if value != self.options.get(value))
                 WidgetLoader.to_widgets(modified_options, self)
@@ -39,6 +39,7 @@
 import formats
 from .ui_tools import ProgressBarDelegate, HeightFixItemDelegate, IconLoader, HeaderActionList, context_menu_pos, natsortkey
 from .ui_common import DictModel, Column, TrackerIconsCache
+from .async_tools import Coalescer, single_flight, flight_reset
 
 
 class TorrentViewModel(DictModel):
@@ -51,9 +52,43 @@ class TorrentViewModel(DictModel):
                     "Error": IconLoader.customIcon("alert16.png"),
                     "Queued": IconLoader.customIcon("queued16.png")}
 
+    filter_counts = None # FilterCounts kept up to date from deltas, installed by FilterView
+
+    countsChanged = QtCore.pyqtSignal()
+
+    def set_filter_counts(self, counts):
+        self.filter_counts = counts
+        if counts is not None:
+            for item in self.items.itervalues():
+                counts.add(item)
+            self.countsChanged.emit()
+
+    def _clear(self):
+        DictModel._clear(self)
+        if self.filter_counts is not None:
+            self.filter_counts.clear()
+
+    @property
+    def observed_fields(self):
+        return self.filter_counts.fields if self.filter_counts is not None else None
+
+    def _observeItem(self, old_item, new_item):
+        if old_item is not None:
+            self.filter_counts.remove(old_item)
+        if new_item is not None:
+            self.filter_counts.add(new_item)
+        self._counts_touched = True
+
+    def apply_delta(self, added=None, removed=None, changed=None):
+        self._counts_touched = False
+        DictModel.apply_delta(self, added, removed, changed)
+        if self._counts_touched:
+            self.countsChanged.emit()
+
     def _refresh_trackers(self, result):
-        tracker_columns = self.columnsForFields(["tracker"])
-        self.dataChanged.emit(self.index(0, min(tracker_columns), len(self.order) - 1, max(tracker_columns)))
+        tracker_columns = self.columnsForFields(["tracker_host"])
+        if self.order:
+            self._emitDataChangedRange(self.INVALID_INDEX, 0, len(self.order) - 1, tracker_columns[0], tracker_columns[-1])
 
     def _tracker_icon(self, host):
         d = TrackerIconsCache.get(host)
@@ -95,6 +130,14 @@ class TorrentView(QtGui.QTreeView, component.Component):
 
     selection_changed = QtCore.pyqtSignal(object)
 
+    # Lists longer than this are polled in two tiers: sort fields for all torrents and display fields
+    # only for the rows in (or within viewport_fetch_margin rows of) the viewport.
+    viewport_fetch_threshold = 500
+    viewport_fetch_margin = 20
+
+    # Torrent events arriving within this many milliseconds result in a single refresh
+    event_coalesce_window = 100
+
     def __init__(self, parent=None):
         QtGui.QTreeWidget.__init__(self, parent)
         component.Component.__init__(self, "TorrentView", interval=2, depend=["SessionProxy"])
@@ -105,13 +148,19 @@ def __init__(self, parent=None):
         self.model().resize_header(self.header())
 
         self.filter = {}
+        self.loaded_filter = None # filter of the last full update, {} when the model holds every torrent
+
+        self._viewport_timer = QtCore.QTimer(self, singleShot=True, interval=100, timeout=self._update_viewport)
+        self.verticalScrollBar().valueChanged.connect(self._viewport_changed)
+        self.verticalScrollBar().rangeChanged.connect(self._viewport_changed)
 
-        client.register_event_handler("TorrentStateChangedEvent", self.update)
-        client.register_event_handler("TorrentAddedEvent", self.update)
-        client.register_event_handler("TorrentRemovedEvent", self.update)
-        client.register_event_handler("TorrentQueueChangedEvent", self.update)
-        client.register_event_handler("SessionPausedEvent", self.update)
-        client.register_event_handler("SessionResumedEvent", self.update)
+        self.event_refresh = Coalescer(self.update, self.event_coalesce_window, self)
+        client.register_event_handler("TorrentStateChangedEvent", self.event_refresh)
+        client.register_event_handler("TorrentAddedEvent", self.event_refresh)
+        client.register_event_handler("TorrentRemovedEvent", self.event_refresh)
+        client.register_event_handler("TorrentQueueChangedEvent", self.event_refresh)
+        client.register_event_handler("SessionPausedEvent", self.event_refresh)
+        client.register_event_handler("SessionResumedEvent", self.event_refresh)
 
         HeaderActionList(self)
 
@@ -124,18 +173,45 @@ def selected_torrent_id(self):
     def selected_torrent_ids(self):
         return [index.internalPointer() for index in self.selectedIndexes()]
 
+    def _viewport_ids(self):
+        rect = self.viewport().rect()
+        top = self.indexAt(rect.topLeft()).row()
+        bottom = self.indexAt(rect.bottomLeft()).row()
+        order = self.model().order
+        if bottom == -1:
+            bottom = len(order) - 1
+        return order[max(top - self.viewport_fetch_margin, 0):bottom + self.viewport_fetch_margin + 1]
+
+    def _viewport_fetch(self):
+        return len(self.model().order) > self.viewport_fetch_threshold
+
+    def _with_count_fields(self, fields):
+        counts = self.model().filter_counts
+        return list(counts.fields.union(fields)) if counts is not None else fields
+
     @defer.inlineCallbacks
     def start(self):
-        status = yield component.get("SessionProxy").get_torrents_status({}, self.model().fieldsForColumns())
+        status = yield component.get("SessionProxy").get_torrents_status(
+            {}, self._with_count_fields(self.model().fieldsForColumns()))
+        self.loaded_filter = {}
         self.model().update(status)
 
     def stop(self):
+        flight_reset(self)
         self.model().clear()
+        self.loaded_filter = None
 
-    @defer.inlineCallbacks
+    @single_flight("filter")
     def update(self, unused=None):
-        status = yield component.get("SessionProxy").get_torrents_status(self.filter, self.model().fieldsForColumns(self.isColumnHidden))
+        if self._viewport_fetch():
+            fields = list(self.model().sort_column.fields)
+        else:
+            fields = self.model().fieldsForColumns(self.isColumnHidden)
+        filter = self.filter
+        status = yield component.get("SessionProxy").get_torrents_status(filter, self._with_count_fields(fields))
+        self.loaded_filter = filter # before the update: count listeners check it
         self.model().update(status)
+        yield self._update_viewport()
 
     def selectionChanged(self, selected, deselected):
         QtGui.QTreeView.selectionChanged(self, selected, deselected)
@@ -151,3 +227,16 @@ def set_filter(self, filter):
         if self.filter != filter:
             self.filter = filter
             self.update()
+
+    @QtCore.pyqtSlot()
+    def _viewport_changed(self):
+        self._viewport_timer.start() # fetch display fields for newly exposed rows once scrolling settles
+
+    @QtCore.pyqtSlot()
+    @single_flight()
+    def _update_viewport(self):
+        torrent_ids = self._viewport_fetch() and self._viewport_ids()
+        if torrent_ids:
+            status = yield component.get("SessionProxy").get_torrents_status(
+                {"id": torrent_ids}, self.model().fieldsForColumns(self.isColumnHidden))
+            self.model().update(status, partial=True)
@@ -29,7 +29,9 @@
 #    statement from all source files in the program, then also delete it here.
 #
 
+import bisect
 import operator
+from itertools import izip
 import posixpath
 import logging
 
@@ -75,6 +77,38 @@ def _add_formatter(self, key, arg):
         self.formatters[self._role_map[key]] = formatter
 
 
+def _row_runs(rows):
+    """Split sorted row numbers into (first, last) runs of consecutive rows."""
+    first = last = None
+    for row in rows:
+        if last is not None and row == last + 1:
+            last = row
+        else:
+            if last is not None:
+                yield first, last
+            first = last = row
+    if last is not None:
+        yield first, last
+
+
+class _MissingSortKey(object):
+    """Sort key of items that lack some of the sort column's fields: greater than any other key."""
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return self is other
+
+    def __gt__(self, other):
+        return self is not other
+
+    def __ge__(self, other):
+        return True
+
+_MISSING_SORT_KEY = _MissingSortKey()
+
+
 class BaseModel(QtCore.QAbstractItemModel):
 
     # NOTE: QModelIndex.internalPointer() does not count as a python reference, so care must be taken
@@ -86,8 +120,14 @@ def __init__(self, parent):
         QtCore.QAbstractItemModel.__init__(self, parent)
 
         self.columns = self._create_columns()
+        self._field_columns = {}
+        for i, column in enumerate(self.columns):
+            for field in column.fields:
+                self._field_columns.setdefault(field, []).append(i)
         self._clear()
 
+        self.data_changed_ranges = 0 # number of dataChanged emissions, for diagnostics
+
         self.sort_column = None
         self.sort_args = None
 
@@ -109,7 +149,10 @@ def fieldsForColumns(self, isColumnHidden=None):
         return list(fields)
 
     def columnsForFields(self, fields):
-        return [i for i, column in enumerate(self.columns) if bool(column.fields.intersection(fields))]
+        columns = set()
+        for field in fields:
+            columns.update(self._field_columns.get(field, ()))
+        return sorted(columns)
 
     def headerData(self, section, orientation, role):
         if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
@@ -133,6 +176,24 @@ def clear(self):
             self._clear()
             self.reset()
 
+    def _emitDataChanged(self, spans, parent=INVALID_INDEX):
+        """Emit dataChanged for (row, first_column, last_column) spans under the parent index.
+           Spans of consecutive rows are coalesced into a single range."""
+        run = None
+        for row, left, right in sorted(spans):
+            if run and row <= run[1] + 1:
+                run[1:] = max(run[1], row), min(run[2], left), max(run[3], right)
+            else:
+                if run:
+                    self._emitDataChangedRange(parent, *run)
+                run = [row, row, left, right]
+        if run:
+            self._emitDataChangedRange(parent, *run)
+
+    def _emitDataChangedRange(self, parent, top, bottom, left, right):
+        self.data_changed_ranges += 1
+        self.dataChanged.emit(self.index(top, left, parent), self.index(bottom, right, parent))
+
     def resize_header(self, header):
         em = header.fontMetrics().width('M') # not the actual em, but enough for initial sizing
         for i, column in enumerate(self.columns):
@@ -140,16 +201,66 @@ def resize_header(self, header):
 
 
 class DictModel(BaseModel):
-    """Non-hierarchical model with a backing store of the form dict(item_id => dict(item_data))."""
+    """Non-hierarchical model with a backing store of the form dict(item_id => dict(item_data)).
+
+       The model is modified incrementally: apply_delta() adds, removes and patches individual items, update() does
+       the same for a full snapshot by diffing it against the current items first."""
+
+    # Rows with changed sort keys are moved one by one (beginMoveRows) instead of re-sorting the whole model,
+    # unless there are too many of them
+    incremental_sort = QtCore.QT_VERSION >= 0x040600
+    incremental_sort_limit = 200
+
+    # Additions larger than this fraction of the model re-sort everything (layoutChanged) instead of inserting
+    # rows one by one. None always inserts, keeping selections and scroll position undisturbed by relayouts.
+    bulk_add_fraction = 0.25
 
     def _clear(self):
         self.order = []
+        self.rows = {} # item_id => row in order, kept in sync by _renumber()
         self.items = {}
+        self._sort_keys = {} # item_id => cached sort_column.sorter(item), dropped when sort fields change
+        self.revision = 0 # bumped by every non-empty delta
 
     def _sort(self, column, reverse):
+        if column is not self.sort_column:
+            self._sort_keys = {}
         self.sort_column = column
-        self.sort_args = {"key": lambda id: column.sorter(self.items[id]), "reverse": reverse}
+        self.sort_args = {"key": self._sort_key, "reverse": reverse}
         self.order.sort(**self.sort_args)
+        self._renumber()
+
+    def _sort_key(self, id):
+        try:
+            return self._sort_keys[id]
+        except KeyError:
+            pass
+        try:
+            key = self.sort_column.sorter(self.items[id])
+        except KeyError:
+            # fields not fetched yet (viewport mode fills rows in lazily), the key is computed once they arrive
+            return _MISSING_SORT_KEY
+        self._sort_keys[id] = key
+        return key
+
+    def _bisect(self, id):
+        """Find the row to insert id into self.order so that it stays sorted (after rows with equal keys)."""
+        key, reverse = self._sort_key(id), self.sort_args["reverse"]
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = self._sort_key(self.order[mid])
+            if (mid_key < key) if reverse else (key < mid_key):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _renumber(self, start=0, stop=None):
+        """Refresh rows of order[start:stop] in self.rows. Must follow every change of order."""
+        if stop is None:
+            stop = len(self.order)
+        self.rows.update(izip(self.order[start:stop], xrange(start, stop)))
 
     def rowCount(self, parent):
         if parent.isValid():
@@ -173,53 +284,177 @@ def data(self, index, role):
             except (IndexError, KeyError):
                 pass
 
-    def _data_change_bounds(self, new_items):
-        # NOTE: current (Qt 4.6) QAbstractItemModel implementation repaints the whole viewport regardless
-        # of the arguments passed to dataChanged, so calculating precise change bounds is not really necessary
-        changed_fields = set()
-        top = bottom = None
-        for i, id in enumerate(self.items):
-            data, new_data = self.items[id], new_items[id]
-            if new_data != data:
-                changed_fields.update(field for field in new_data if new_data[field] != data.get(field))
-                if top is None:
-                    top = i
-                bottom = i
-        changed_columns = self.columnsForFields(changed_fields)
-        return top, min(changed_columns), bottom, max(changed_columns)
-
-    def update(self, new_items):
-        if self.items != new_items:
-            new_order = None
-            sort_args = {"key": lambda id: self.sort_column.sorter(new_items[id]), "reverse": self.sort_args["reverse"]}
-            if len(self.items) == len(new_items):
-                try:
-                    new_order = sorted(self.order, **sort_args)
-                except KeyError:
-                    pass
-            if self.order == new_order:
-                top, left, bottom, right = self._data_change_bounds(new_items)
-                self.items = new_items
-                self.dataChanged.emit(self.index(top, left), self.index(bottom, right))
+    def diff(self, new_items, partial=False):
+        """Compare a snapshot with the current items. Returns (added, removed, changed) for apply_delta.
+           Partial snapshot may contain any subset of items and fields; only changes to existing items are reported."""
+        items = self.items
+        added, changed = {}, {}
+        for id, new_data in new_items.iteritems():
+            data = items.get(id)
+            if data is None:
+                if not partial:
+                    added[id] = new_data
+            elif data != new_data:
+                fields = dict((field, value) for field, value in new_data.iteritems()
+                              if field not in data or data[field] != value)
+                if fields:
+                    changed[id] = fields
+        if not partial and len(items) + len(added) != len(new_items):
+            removed = [id for id in items if id not in new_items]
+        else:
+            removed = []
+        return added, removed, changed
+
+    def update(self, new_items, partial=False):
+        self.apply_delta(*self.diff(new_items, partial))
+
+    def apply_delta(self, added=None, removed=None, changed=None):
+        """Apply incremental changes to the model.
+
+           added: dict(item_id => item_data) of new items
+           removed: iterable of item ids to remove
+           changed: dict(item_id => dict(field => value)) of updated fields for existing items"""
+        if added or removed or changed:
+            self.revision += 1
+
+        observed_fields = self.observed_fields
+        if observed_fields is not None:
+            items = self.items
+            removed = [id for id in removed or () if id in items]
+            old_items = [(id, items[id]) for id in removed]
+            # changed items are updated in place, so their old state has to be copied
+            old_items.extend((id, dict(items[id])) for id, fields in (changed or {}).iteritems()
+                             if id in items and not observed_fields.isdisjoint(fields))
+
+        if removed:
+            self._remove_items(removed)
+        if changed:
+            self._change_items(changed)
+        if added:
+            self._add_items(added)
+
+        if observed_fields is not None:
+            for id, old_item in old_items:
+                self._observeItem(old_item, items.get(id))
+            for id in added or ():
+                self._observeItem(None, items[id])
+
+    # Fields watched by _observeItem, None to skip observation.
+    observed_fields = None
+
+    def _observeItem(self, old_item, new_item):
+        """Called by apply_delta for every item added (old_item is None), removed (new_item is None) or changed in
+           one of observed_fields. Subclasses override it to keep derived data (aggregates, counts) up to date."""
+        pass
+
+    def _remove_items(self, ids):
+        row_map = self.rows
+        rows = sorted(row_map[id] for id in ids if id in row_map)
+        for first, last in reversed(list(_row_runs(rows))):
+            self.beginRemoveRows(self.INVALID_INDEX, first, last)
+            for id in self.order[first:last + 1]:
+                del self.items[id]
+                del row_map[id]
+                self._sort_keys.pop(id, None)
+            del self.order[first:last + 1]
+            self.endRemoveRows()
+        if rows:
+            self._renumber(rows[0])
+
+    def _change_items(self, changed):
+        items = self.items
+        sort_fields = self.sort_column.fields if self.sort_column else frozenset()
+        resorted = [id for id, fields in changed.iteritems() if id in items and not sort_fields.isdisjoint(fields)]
+        incremental = self.incremental_sort and len(resorted) <= self.incremental_sort_limit
+
+        for id, fields in changed.iteritems():
+            try:
+                data = items[id]
+            except KeyError:
+                continue
+            if sort_fields.isdisjoint(fields):
+                data.update(fields)
+            elif incremental:
+                old_key = self._sort_key(id)
+                data.update(fields)
+                self._sort_keys.pop(id, None) # not cached for rows with missing sort fields
+                if self._sort_key(id) != old_key:
+                    self._move_row(self.rows[id])
             else:
+                data.update(fields)
+                self._sort_keys.pop(id, None)
+
+        if resorted and not incremental:
+            new_order = sorted(self.order, **self.sort_args)
+            if self.order != new_order:
                 self.layoutAboutToBeChanged.emit()
-                self.order = new_order or sorted(new_items.iterkeys(), **sort_args)
+                self.order = new_order
+                self._renumber()
                 self._updatePersistentIndexes()
-                self.items = new_items # NB: updated after persistent indexes to keep old ids alive
                 self.layoutChanged.emit()
+                return
+
+        row_map = self.rows
+        spans = []
+        for id, fields in changed.iteritems():
+            columns = self.columnsForFields(fields)
+            if columns and id in row_map:
+                spans.append((row_map[id], columns[0], columns[-1]))
+        self._emitDataChanged(spans)
+
+    def _move_row(self, row):
+        """Move a single row whose sort key has changed to its sorted position. The rest of the rows must be sorted."""
+        id = self.order.pop(row)
+        new_row = self._bisect(id)
+        self.order.insert(row, id)
+        if new_row != row:
+            # NB: destination row is given in terms of the row numbering before the move
+            self.beginMoveRows(self.INVALID_INDEX, row, row, self.INVALID_INDEX, new_row + (new_row > row))
+            del self.order[row]
+            self.order.insert(new_row, id)
+            self._renumber(min(row, new_row), max(row, new_row) + 1)
+            self.endMoveRows()
+
+    def _add_items(self, added):
+        self.items.update(added)
+        if not self.sort_column or not self.order:
+            new_ids = sorted(added, **self.sort_args) if self.sort_column else list(added)
+            first = len(self.order)
+            self.beginInsertRows(self.INVALID_INDEX, first, first + len(new_ids) - 1)
+            self.order.extend(new_ids)
+            self._renumber(first)
+            self.endInsertRows()
+        elif self.bulk_add_fraction is not None and len(added) > len(self.order) * self.bulk_add_fraction:
+            self.layoutAboutToBeChanged.emit()
+            self.order.extend(added)
+            self.order.sort(**self.sort_args)
+            self._renumber()
+            self._updatePersistentIndexes()
+            self.layoutChanged.emit()
+        else:
+            # rows is not read while inserting (_bisect works on order), so it is renumbered once at the end
+            first = len(self.order)
+            for id in added:
+                row = self._bisect(id)
+                self.beginInsertRows(self.INVALID_INDEX, row, row)
+                self.order.insert(row, id)
+                self.endInsertRows()
+                first = min(first, row)
+            self._renumber(first)
 
     def _updatePersistentIndexes(self):
+        # only indexes that actually moved are remapped
         old_indexes, new_indexes = [], []
-        row_map = dict((id, i) for i, id in enumerate(self.order))
+        row_map = self.rows
         for index in self.persistentIndexList():
-            try:
-                row = row_map[index.internalPointer()]
-                if row != index.row():
-                    old_indexes.append(index)
-                    new_indexes.append(self.createIndex(row, index.column(), id))
-            except KeyError:
+            id = index.internalPointer()
+            row = row_map.get(id)
+            if row is None:
                 old_indexes.append(index)
                 new_indexes.append(self.INVALID_INDEX)
+            elif row != index.row():
+                old_indexes.append(index)
+                new_indexes.append(self.createIndex(row, index.column(), id))
         if new_indexes:
             self.changePersistentIndexList(old_indexes, new_indexes)
 
@@ -232,15 +467,27 @@ class FileModel(BaseModel):
     indexesAdded = QtCore.pyqtSignal(object)
 
     class Item(object):
+        # Trees of large torrents hold hundreds of thousands of items, so they are kept small: no instance dicts
+        # (subclasses must declare empty __slots__ too) and no containers for files.
+
+        __slots__ = ("parent", "model", "name", "index", "children", "names", "aggregates", "pending", "_row")
 
         def __init__(self, parent=None, name='', model=None, index=None):
             self.parent = parent
             self.model = model
             self.name = name
             self.index = index
+            if index is None:
+                self.children = []
+                self.names = {} # child name => child
+                self.aggregates = {} # folder field => cached value, see aggregate()
+            else:
+                self.children = ()
+                self.names = None
+                self.aggregates = None
+            self.pending = None # (lo, hi, depth) slice of FileModel.paths below a folder whose children are not built
             if parent:
-                parent.children.append(self)
-            self.children = []
+                parent.append(self)
 
         def __getitem__(self, name):
             return getattr(self, name) # assume exception is never thrown
@@ -252,14 +499,96 @@ def is_file(self):
         def size(self):
             if self.is_file():
                 return self.model.files[self.index]["size"]
-            return sum(child.size for child in self.children)
+            return self.aggregate("size")
+
+        def _aggregate_size(self, values):
+            return sum(values)
+
+        def aggregate(self, field):
+            """Folder value of field combined by _aggregate_<field>(values) from the values of children
+               (or from the path index, if children are not built yet) and cached until dropped."""
+            try:
+                return self.aggregates[field]
+            except KeyError:
+                if self.pending:
+                    value = self.model._pending_aggregate(self, field, *self.pending)
+                else:
+                    value = getattr(self, "_aggregate_" + field)([child[field] for child in self.children])
+                self.aggregates[field] = value
+                return value
+
+        def drop_aggregates(self, field=None):
+            """Drop cached aggregates (all fields if None) of this folder and its ancestors.
+               A cached folder value implies cached values below it, so the walk stops at the first folder
+               that has nothing to drop."""
+            item = self
+            while item:
+                if field is None:
+                    if not item.aggregates:
+                        break
+                    item.aggregates.clear()
+                elif field in item.aggregates:
+                    del item.aggregates[field]
+                else:
+                    break
+                item = item.parent
 
         def row(self):
             if self.parent:
-                try:
-                    return self.parent.children.index(self)
-                except ValueError:
-                    pass
+                return self._row
+
+        def append(self, child):
+            child._row = len(self.children)
+            self.children.append(child)
+            self.names[child.name] = child
+            self.drop_aggregates()
+
+        def insert(self, row, child):
+            child.parent = self
+            self.children.insert(row, child)
+            self.renumber(row)
+            self.names[child.name] = child
+            self.drop_aggregates()
+
+        def remove(self, child):
+            row = child._row
+            del self.children[row]
+            self.renumber(row)
+            if self.names.get(child.name) is child:
+                del self.names[child.name]
+            self.drop_aggregates()
+
+        def extend(self, children):
+            start = len(self.children)
+            self.children.extend(children)
+            for child in children:
+                child.parent = self
+                self.names[child.name] = child
+            self.renumber(start)
+            self.drop_aggregates()
+
+        def remove_all(self, children):
+            """Remove several children in one pass."""
+            removed = set(children)
+            self.children[:] = [child for child in self.children if child not in removed]
+            self.renumber()
+            for child in children:
+                if self.names.get(child.name) is child:
+                    del self.names[child.name]
+            self.drop_aggregates()
+
+        def rename(self, name):
+            names = self.parent.names if self.parent else {}
+            if names.get(self.name) is self:
+                del names[self.name]
+            self.name = name
+            names[name] = self
+
+        def renumber(self, start=0):
+            """Refresh cached rows of children from start on. Must follow every reordering of children."""
+            children = self.children
+            for row in xrange(start, len(children)):
+                children[row]._row = row
 
         def invalidate(self):
             self.parent = None
@@ -267,17 +596,28 @@ def invalidate(self):
                 child.invalidate()
 
         def sort(self, **kwargs):
-            self.children.sort(**kwargs)
-            for child in self.children:
-                child.sort(**kwargs)
+            if self.children:
+                self.children.sort(**kwargs)
+                self.renumber()
+                for child in self.children:
+                    child.sort(**kwargs)
 
         def validate(self):
             if self.parent:
                 assert self.name
-            for child in self.children:
+            for row, child in enumerate(self.children):
                 assert child.parent == self
+                assert child._row == row
+                assert child.name in self.names
                 child.validate()
 
+    # Above this number of files update() builds the tree lazily: folder children are created on fetchMore()
+    # from a sorted path index, so only expanded folders materialize items. None disables lazy mode.
+    lazy_threshold = None
+
+    # Debug mode: check the whole tree after every structural change (slow on large trees)
+    validate_changes = False
+
     def __init__(self, parent, path=posixpath):
         BaseModel.__init__(self, parent)
         self.path = path
@@ -295,15 +635,34 @@ def _sort(self, column, reverse):
         self.root.sort(**self.sort_args)
 
     def _clear(self):
-        self.root = self.Item()
+        self.root = self.Item(model=self)
         self.files = {}
         self.file_items = []
+        self.paths = [] # lazy mode: sorted [(path components, file index)]
+        self._path_pos = [] # lazy mode: file index => position in paths
+        self._pending_los = [] # lazy mode: sorted lo's of pending folders (their slices of paths are disjoint)
+        self._pending_items = {} # lazy mode: lo => pending folder
+        self.item_count = 1 # items built so far, for estimated_size()
 
     def rowCount(self, parent):
         if parent.column() > 0:
             return 0
         return len((parent.internalPointer() or self.root).children)
 
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return False
+        item = parent.internalPointer() or self.root
+        return bool(item.children or item.pending)
+
+    def canFetchMore(self, parent):
+        return bool((parent.internalPointer() or self.root).pending)
+
+    def fetchMore(self, parent):
+        item = parent.internalPointer() or self.root
+        if item.pending:
+            self._fetch(item)
+
     def index(self, row, column, parent=QtCore.QModelIndex()):
         try:
             return self.createIndex(row, column, (parent.internalPointer() or self.root).children[row])
@@ -332,6 +691,10 @@ def update(self, files):
 
         self.clear()
 
+        if self.lazy_threshold is not None and len(files) > self.lazy_threshold:
+            self._update_lazy(files)
+            return
+
         items = {"": self.root}
         def _item(path):
             try:
@@ -346,6 +709,96 @@ def _item(path):
             self.file_items.append(self.Item(_item(path), name, self, i))
 
         self.files = files
+        self.item_count = len(items) + len(self.file_items)
+
+    def _update_lazy(self, files):
+        sep = self.path.sep
+        self.paths = sorted((tuple(file["path"].split(sep)), i) for i, file in enumerate(files))
+        self._path_pos = [0] * len(files)
+        for pos, (parts, i) in enumerate(self.paths):
+            self._path_pos[i] = pos
+        self.file_items = [None] * len(files)
+        self.files = files
+
+        self.root.pending = (0, len(self.paths), 0)
+        self._pending_los = [0]
+        self._pending_items = {0: self.root}
+        self._fetch(self.root)
+
+    def _groups(self, lo, hi, depth):
+        # Children of a pending folder: (name, lo, hi, file index or None for folders) for each run of paths[lo:hi]
+        # sharing the component at depth.
+        paths = self.paths
+        while lo < hi:
+            parts, index = paths[lo]
+            name = parts[depth]
+            end = lo + 1
+            if len(parts) == depth + 1:
+                yield name, lo, end, index
+            else:
+                while end < hi and paths[end][0][depth] == name:
+                    end += 1
+                yield name, lo, end, None
+            lo = end
+
+    def _pending_aggregate(self, folder, field, lo, hi, depth):
+        combine = getattr(folder, "_aggregate_" + field)
+        return combine([self.file_value(field, index) if index is not None
+                        else self._pending_aggregate(folder, field, group_lo, group_hi, depth + 1)
+                        for name, group_lo, group_hi, index in self._groups(lo, hi, depth)])
+
+    # Approximate bytes per file dict received from the daemon, per built item and per lazy mode path index entry
+    # (measured on CPython 2.7, 64 bit; see tools/benchmark.py filemodel_memory).
+    _file_bytes, _item_bytes, _path_bytes = 600, 200, 150
+
+    def estimated_size(self):
+        """Rough memory footprint in bytes, computed in constant time."""
+        return len(self.files) * self._file_bytes + self.item_count * self._item_bytes + \
+            len(self.paths) * self._path_bytes
+
+    def file_value(self, field, index):
+        """Value of a file field, without the file item (it may not exist in lazy mode)."""
+        return self.files[index][field]
+
+    def _fetch(self, item):
+        lo, hi, depth = item.pending
+        item.pending = None
+        del self._pending_items[lo] # the first child folder (if any) starts at the same lo
+
+        groups = list(self._groups(lo, hi, depth))
+        self.item_count += len(groups)
+        parent = self.createIndex(item.row(), 0, item) if item is not self.root else self.INVALID_INDEX
+        self.beginInsertRows(parent, 0, len(groups) - 1)
+        new_los = []
+        for name, group_lo, group_hi, index in groups:
+            if index is None:
+                child = self.Item(item, name, self)
+                child.pending = (group_lo, group_hi, depth + 1)
+                self._pending_items[group_lo] = child
+                new_los.append(group_lo)
+            else:
+                self.file_items[index] = self.Item(item, name, self, index)
+        if self.sort_args:
+            item.children.sort(**self.sort_args)
+            item.renumber()
+        self.endInsertRows()
+
+        # child folders take over the slice of their parent
+        pos = bisect.bisect_left(self._pending_los, lo)
+        self._pending_los[pos:pos + 1] = new_los
+
+    def _pending_folder(self, index):
+        # the pending folder that holds the file with index (lazy mode, the file item is not built yet)
+        pos = self._path_pos[index]
+        return self._pending_items[self._pending_los[bisect.bisect_right(self._pending_los, pos) - 1]]
+
+    def file_item(self, index):
+        """Item of the file with index, built on demand in lazy mode."""
+        item = self.file_items[index]
+        while item is None:
+            self._fetch(self._pending_folder(index))
+            item = self.file_items[index]
+        return item
 
     def flags(self, index):
         flags = BaseModel.flags(self, index) | QtCore.Qt.ItemIsDragEnabled
@@ -384,13 +837,13 @@ def setData(self, index, value, role):
 
     def _updatePersistentIndexes(self):
         old_indexes, new_indexes = [], []
-        prev_item = None
         for index in self.persistentIndexList():
             item = index.internalPointer()
-            if item != prev_item: # selection indexes often come in rows, save an row() call if possible
-                row = item.row()
-                prev_item = item
-            if row is not None and row != index.row():
+            row = item.row()
+            if row is None: # removed from the tree
+                old_indexes.append(index)
+                new_indexes.append(self.INVALID_INDEX)
+            elif row != index.row():
                 old_indexes.append(index)
                 new_indexes.append(self.createIndex(row, index.column(), item))
         if new_indexes:
@@ -402,41 +855,86 @@ def _findItem(self, path):
         for part in path.split("/"):
             if not part:
                 continue
-            for child in parent.children:
-                if child.name == part:
-                    parent = child
-                    break
-            else:
-                new_item = self.Item(parent, part)
-                new_items.append(new_item)
-                parent.children.sort(**self.sort_args)
-                parent = new_item
+            if parent.pending:
+                self._fetch(parent)
+            child = parent.names.get(part)
+            if child is None:
+                child = self.Item(None, part, self)
+                parent.insert(self._insertionRow(parent, child), child)
+                new_items.append(child)
+                self.item_count += 1
+            parent = child
         return parent, new_items
 
+    def _insertionRow(self, parent, item):
+        # row that keeps parent.children sorted (after children with equal keys), found by bisection
+        children = parent.children
+        if not self.sort_args or self.sort_args["key"] is None: # unsorted, or a column without a sort key
+            return len(children)
+        sort_key, reverse = self.sort_args["key"], self.sort_args["reverse"]
+        key = sort_key(item)
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = sort_key(children[mid])
+            if (mid_key < key) if reverse else (key < mid_key):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
     def _reparentItems(self, items, new_parent):
+        if new_parent.pending:
+            self._fetch(new_parent)
+
+        # items already in place and folders dropped into their own subtree stay where they are
+        ancestors = set()
+        ancestor = new_parent
+        while ancestor:
+            ancestors.add(ancestor)
+            ancestor = ancestor.parent
+        # row selections carry one index (hence one item) per column, keep the first of each
+        seen = set()
+        items = [item for item in items if item.parent is not new_parent and item not in ancestors
+                 and not (item in seen or seen.add(item))]
+        if not items:
+            return
+
         self.layoutAboutToBeChanged.emit()
+
+        by_parent = {}
         for item in items:
-            parent = item.parent
-            parent.children.remove(item)
-            item.parent = new_parent
-            new_parent.children.append(item)
-            self.root.validate()
-            while parent and not parent.children: # kill empty folders
-                next_parent = parent.parent
-                next_parent.children.remove(parent)
-                parent.invalidate()
-                parent = next_parent
-                self.root.validate()
-
-        new_parent.children.sort(**self.sort_args)
+            by_parent.setdefault(item.parent, []).append(item)
+        for parent, children in by_parent.iteritems():
+            parent.remove_all(children)
+        new_parent.extend(items)
+        if self.sort_args:
+            new_parent.children.sort(**self.sort_args)
+            new_parent.renumber()
+
+        # kill empty folders, level by level, one pass per parent
+        empty = [parent for parent in by_parent if not parent.children and parent.parent]
+        while empty:
+            by_parent = {}
+            for folder in empty:
+                by_parent.setdefault(folder.parent, []).append(folder)
+            for parent, folders in by_parent.iteritems():
+                parent.remove_all(folders)
+                for folder in folders:
+                    folder.invalidate()
+            empty = [parent for parent in by_parent if not parent.children and parent.parent]
+
         self._updatePersistentIndexes()
         self.layoutChanged.emit()
 
+        if self.validate_changes:
+            self.root.validate()
+
     def _renameItem(self, item, path):
         parent_path, name = self.path.split(path.rstrip(self.path.sep))
         new_parent, new_items = self._findItem(parent_path)
 
-        item.name = name
+        item.rename(name)
         if item.parent != new_parent:
             self._reparentItems([item], new_parent)
             if new_items:
@@ -445,19 +943,50 @@ def _renameItem(self, item, path):
             index = self.createIndex(item.row(), 0, item)
             self.dataChanged.emit(index, index)
 
-        self.root.validate()
+        if self.validate_changes:
+            self.root.validate()
 
     def renameFile(self, index, path):
         self.files[index]["path"] = path
-        self._renameItem(self.file_items[index], path)
+        self._renameItem(self.file_item(index), path)
 
     def renameFolder(self, old_name, new_name):
-        for i, file in enumerate(self.files):
-            if file["path"].startswith(old_name):
-                file["path"] = file["path"].replace(old_name, new_name, 1)
-                item = self.file_items[i].parent
+        item = self._folderItem(old_name)
+        if item is None or item is self.root:
+            log.debug("renameFolder: no folder %s", old_name)
+            return
+        # only the files of the renamed subtree change paths
+        for i in self._subtreeFiles(item):
+            file = self.files[i]
+            file["path"] = new_name + file["path"][len(old_name):]
         self._renameItem(item, new_name)
 
+    def _folderItem(self, path):
+        # existing folder at path, found by walking the tree one path component at a time
+        item = self.root
+        for part in path.split("/"):
+            if not part:
+                continue
+            if item.pending:
+                self._fetch(item)
+            item = item.names.get(part)
+            if item is None or item.is_file():
+                return None
+        return item
+
+    def _subtreeFiles(self, item):
+        # indexes of all files below item, including those of pending folders
+        if item.is_file():
+            yield item.index
+        elif item.pending:
+            lo, hi, depth = item.pending
+            for parts, index in self.paths[lo:hi]:
+                yield index
+        else:
+            for child in item.children:
+                for index in self._subtreeFiles(child):
+                    yield index
+
     class ItemMimeData(QtCore.QMimeData):
 
         def __init__(self, items):
@@ -484,7 +1013,7 @@ def mimeData(self, indexes):
     def dropMimeData(self, data, action, row, column, parent):
         if action != QtCore.Qt.IgnoreAction and isinstance(data, self.ItemMimeData):
             items = [item for item in data.items if item.parent is not None]
-            self._reparentItems(items, parent.internalIndex() or self.root)
+            self._reparentItems(items, parent.internalPointer() or self.root)
 
 
 class WidgetLoader(object):
@@ -31,6 +31,7 @@
 
 import os
 import re
+import logging
 import pkg_resources
 
 from PyQt4 import QtGui, QtCore
@@ -39,7 +40,9 @@
 import deluge.common
 from deluge import configmanager
 
-from .lang_tools import memoize
+from .lang_tools import memoize, lru_memoize
+
+log = logging.getLogger(__name__)
 
 
 class TextProgressBar(QtGui.QProgressBar):
@@ -140,6 +143,23 @@ def packagePixmap(self, path):
     def customIcon(self, name):
         return self.packageIcon("data/pixmaps/" + name) # note: this is resource path, not FS path
 
+    @memoize
+    def flagIcons(self):
+        """Country flag icons by lowercase country code, cut from the flag atlas made by tools/regen_flags.py.
+           Returns None if the atlas is not available."""
+        index_file = pkg_resources.resource_filename("deluge_qt", "data/pixmaps/flag_atlas.txt")
+        atlas = self.packagePixmap("data/pixmaps/flag_atlas.png")
+        if atlas.isNull() or not os.path.isfile(index_file):
+            log.debug("Flag atlas not found (run tools/regen_flags.py), loading flags one by one")
+            return None
+
+        flags = {}
+        with open(index_file, "rb") as f:
+            for line in f:
+                country, x, y, width, height = line.split()
+                flags[country] = QtGui.QIcon(atlas.copy(int(x), int(y), int(width), int(height)))
+        return flags
+
 
 class _CompatIconLoader(_IconLoader):
 
@@ -264,12 +284,15 @@ def _widgetsWithState(self):
             yield (child.objectName() or child.parent().objectName()), child
 
 
+_natsort_split = re.compile(r"(\d+)").split
+
+@lru_memoize(131072)
 def natsortkey(s):
-    key = []
-    for part in re.split(r"(\d+)", s.lower()):
-        try:
-            part = int(part)
-        except:
-            pass
-        key.append(part)
-    return key
+    """Case-insensitive sort key that orders embedded numbers by value ("file2" < "file10").
+       Byte strings are decoded as UTF-8, so they sort consistently with unicode names."""
+    if isinstance(s, str):
+        s = s.decode("utf-8", "replace")
+    parts = _natsort_split(s.lower())
+    if len(parts) > 1:
+        parts[1::2] = map(int, parts[1::2]) # split() puts captured digit runs at odd positions
+    return tuple(parts)
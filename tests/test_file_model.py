@@ -0,0 +1,69 @@
+#
+# test_file_model.py
+#
+# Copyright (C) 2010 Nikita Nemkin <nikita@nemkin.ru>
+#
+# This file is part of Deluge.
+#
+# Deluge is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Deluge is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Deluge. If not, see <http://www.gnu.org/licenses/>.
+#
+#    In addition, as a special exception, the copyright holders give
+#    permission to link the code of portions of this program with the OpenSSL
+#    library.
+#    You must obey the GNU General Public License in all respects for all of
+#    the code used other than OpenSSL. If you modify file(s) with this
+#    exception, you may extend this exception to your version of the file(s),
+#    but you are not obligated to do so. If you do not wish to do so, delete
+#    this exception statement from your version. If you delete this exception
+#    statement from all source files in the program, then also delete it here.
+#
+
+import unittest
+
+from PyQt4 import QtCore
+
+from deluge_qt.ui_common import FileModel
+
+
+class FileModelDropTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FileModel(None)
+        self.model.validate_changes = True
+        self.model.update([{"path": "Torrent/Source/%s" % name, "size": 1} for name in ("x.txt", "y.txt", "z.txt")] +
+                          [{"path": "Torrent/Target/w.txt", "size": 1}])
+        self.model.sort(0, QtCore.Qt.AscendingOrder)
+
+    def _index(self, item, column=0):
+        return self.model.createIndex(item.row(), column, item)
+
+    def test_drop_multi_column_selection(self):
+        model = self.model
+        top = model.root.names["Torrent"]
+        source, target = top.names["Source"], top.names["Target"]
+
+        # a SelectRows drag carries one index per column of every selected row
+        columns = model.columnCount(model.INVALID_INDEX)
+        indexes = [self._index(item, column) for item in source.children for column in xrange(columns)]
+        data = model.mimeData(indexes)
+        model.dropMimeData(data, QtCore.Qt.MoveAction, -1, -1, self._index(target))
+
+        self.assertEqual([child.name for child in target.children], ["w.txt", "x.txt", "y.txt", "z.txt"])
+        self.assertEqual([child.row() for child in target.children], range(4))
+        self.assertNotIn("Source", top.names)
+        model.root.validate()
+
+
+if __name__ == "__main__":
+    unittest.main()
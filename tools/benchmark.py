@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+"""Micro-benchmarks for performance sensitive parts of the UI code."""
+
+import re
+import os
+import sys
+import time
+import random
+import optparse
+
+
+def _timeit(label, func, *args):
+    start = time.time()
+    result = func(*args)
+    print "    %-40s %8.3f s" % (label, time.time() - start)
+    return result
+
+
+def _filenames(count, seed=0):
+    # Names resembling files of large multi-file torrents: numbered episodes, photos, disc images, archives.
+    rnd = random.Random(seed)
+    words = ["Season", "Episode", "Disc", "Track", "Part", "IMG", "DSC", "Chapter", "Extras", "Sample",
+             u"\u041c\u0443\u0437\u044b\u043a\u0430", "Live", "Remastered", "CD", "vol", "scan"]
+    exts = ["mkv", "avi", "flac", "mp3", "jpg", "JPG", "nfo", "srt", "r%02d" % rnd.randint(0, 99), "iso", "txt"]
+    names = []
+    for i in xrange(count):
+        kind = rnd.randint(0, 3)
+        if kind == 0:
+            name = "%s %02d/%s S%02dE%02d - %s.%s" % (rnd.choice(words), rnd.randint(1, 20), rnd.choice(words),
+                                                       rnd.randint(1, 20), rnd.randint(1, 30), rnd.choice(words),
+                                                       rnd.choice(exts))
+        elif kind == 1:
+            name = "%s_%04d.%s" % (rnd.choice(words), rnd.randint(0, 9999), rnd.choice(exts))
+        elif kind == 2:
+            name = "%02d - %s %s.%s" % (rnd.randint(1, 40), rnd.choice(words), rnd.choice(words), rnd.choice(exts))
+        else:
+            name = "%s.part%d.%s" % (rnd.choice(words).lower(), rnd.randint(1, 300), rnd.choice(exts))
+        names.append(name)
+    return names
+
+
+def _old_natsortkey(s):
+    # ui_tools.natsortkey before the rewrite, for comparison
+    key = []
+    for part in re.split(r"(\d+)", s.lower()):
+        try:
+            part = int(part)
+        except:
+            pass
+        key.append(part)
+    return key
+
+
+def bench_natsortkey(count=100000):
+    from deluge_qt.ui_tools import natsortkey
+
+    names = _filenames(count)
+    print "natsortkey, %d file names" % len(names)
+    _timeit("old: compute keys", map, _old_natsortkey, names)
+    _timeit("old: sorted()", sorted, names, None, _old_natsortkey)
+    natsortkey.cache_clear()
+    _timeit("new: compute keys (cold cache)", map, natsortkey, names)
+    _timeit("new: sorted() (warm cache)", sorted, names, None, natsortkey)
+    byte_names = [name.encode("utf-8") for name in names]
+    natsortkey.cache_clear()
+    _timeit("new: sorted() UTF-8 byte strings", sorted, byte_names, None, natsortkey)
+
+
+_app = None
+
+def _qt_app():
+    # Models create icons in their constructors, which needs a QApplication.
+    global _app
+    from PyQt4 import QtGui
+    if _app is None:
+        _app = QtGui.QApplication.instance() or QtGui.QApplication([])
+    return _app
+
+
+def _torrent_files(count, per_folder=10):
+    # Deep multi-file torrent layout: one top folder, count / per_folder subfolders.
+    return [{"path": "Torrent/Folder %05d/File %02d.dat" % divmod(i, per_folder), "size": i} for i in xrange(count)]
+
+
+def _scroll(model, page=40):
+    # Emulate QTreeView walking an expanded tree page by page: index(), parent() and data() of every visible cell.
+    from PyQt4 import QtCore
+    display = QtCore.Qt.DisplayRole
+    columns = range(model.columnCount(model.INVALID_INDEX))
+    visible = []
+    def walk(parent):
+        for row in xrange(model.rowCount(parent)):
+            index = model.index(row, 0, parent)
+            visible.append(index)
+            walk(index)
+    walk(model.INVALID_INDEX)
+    for start in xrange(0, len(visible), page):
+        for index in visible[start:start + page]:
+            parent = model.parent(index)
+            for column in columns:
+                model.data(model.index(index.row(), column, parent), display)
+    return len(visible)
+
+
+def bench_filemodel_scroll(count=50000):
+    _qt_app()
+    from PyQt4 import QtCore
+    from deluge_qt.ui_common import FileModel
+
+    class OldFileModel(FileModel):
+        class Item(FileModel.Item):
+            def row(self): # before the row index
+                if self.parent:
+                    try:
+                        return self.parent.children.index(self)
+                    except ValueError:
+                        pass
+
+    files = _torrent_files(count)
+    print "FileModel scrolling, %d files" % len(files)
+    for label, model_class in [("old", OldFileModel), ("new", FileModel)]:
+        model = model_class(None)
+        model.update(files)
+        model.sort(0, QtCore.Qt.AscendingOrder)
+        _timeit("%s: scroll through the tree" % label, _scroll, model)
+        _timeit("%s: row() of every file" % label, map, model_class.Item.row, model.file_items)
+
+
+def _tree_size(item):
+    # Bytes held by an item tree: items, their instance dicts and containers. Names are not counted, both layouts
+    # hold the same strings.
+    size = sys.getsizeof(item)
+    for attr in ("__dict__", "children", "names", "aggregates"):
+        value = getattr(item, attr, None)
+        if value is not None:
+            size += sys.getsizeof(value)
+    for child in item.children:
+        size += _tree_size(child)
+    return size
+
+
+class _DictItem(object):
+    # Original FileModel.Item layout: an instance dict and a children list per item.
+
+    def __init__(self, parent, name, index):
+        self.parent = parent
+        self.model = None
+        self.name = name
+        self.index = index
+        self.children = []
+        if parent:
+            parent.children.append(self)
+
+
+def _copy_tree(item, parent=None):
+    copy = _DictItem(parent, item.name, item.index)
+    for child in item.children:
+        _copy_tree(child, copy)
+    return copy
+
+
+def bench_filemodel_memory(count=100000):
+    _qt_app()
+    from deluge_qt.ui_common import FileModel
+
+    files = _torrent_files(count)
+    print "FileModel memory, %d files" % len(files)
+    model = FileModel(None)
+    _timeit("build tree", model.update, files)
+    old_size = _tree_size(_copy_tree(model.root))
+    new_size = _tree_size(model.root)
+    print "    %-40s %8.1f MB" % ("old: original dict based items", old_size / 1048576.)
+    print "    %-40s %8.1f MB" % ("new: __slots__ items", new_size / 1048576.)
+
+
+BENCHMARKS = {"natsortkey": bench_natsortkey,
+              "filemodel_scroll": bench_filemodel_scroll,
+              "filemodel_memory": bench_filemodel_memory}
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] [benchmark...]")
+    parser.add_option("-s", "--source-dir", dest="src_dir", metavar="DIR", default="..")
+    parser.add_option("-n", "--count", dest="count", type="int", help="problem size (default: per benchmark)")
+    options, args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(options.src_dir))
+    for name in args or sorted(BENCHMARKS):
+        if options.count:
+            BENCHMARKS[name](options.count)
+        else:
+            BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Pack deluge's country flags into a single image (flag atlas) with an index of flag rectangles."""
+
+import os
+import optparse
+import pkg_resources
+
+from PyQt4 import QtGui
+
+
+def find_flags_dir():
+    for path in ("data/pixmaps/flags", "ui/data/pixmaps/flags"):
+        flags_dir = pkg_resources.resource_filename("deluge", path)
+        if os.path.isdir(flags_dir):
+            return flags_dir
+    raise RuntimeError("deluge flags not found, use --flags-dir")
+
+
+_app = None # image plugins need an application instance, kept alive while images are loaded and saved
+
+
+def pack_flags(options):
+    global _app
+    _app = QtGui.QApplication([])
+
+    flags_dir = options.flags_dir or find_flags_dir()
+    print "Load flags from", flags_dir
+    flags = []
+    for name in sorted(os.listdir(flags_dir)):
+        country, ext = os.path.splitext(name)
+        if ext == ".png":
+            image = QtGui.QImage(os.path.join(flags_dir, name))
+            if not image.isNull():
+                flags.append((country.lower(), image))
+
+    cell_width = max(image.width() for country, image in flags)
+    cell_height = max(image.height() for country, image in flags)
+    rows = (len(flags) + options.columns - 1) // options.columns
+
+    atlas = QtGui.QImage(cell_width * options.columns, cell_height * rows, QtGui.QImage.Format_ARGB32)
+    atlas.fill(0)
+    painter = QtGui.QPainter(atlas)
+    index = []
+    for i, (country, image) in enumerate(flags):
+        x, y = (i % options.columns) * cell_width, (i // options.columns) * cell_height
+        painter.drawImage(x, y, image)
+        index.append("%s %d %d %d %d\n" % (country, x, y, image.width(), image.height()))
+    painter.end()
+
+    pixmaps_dir = os.path.join(options.src_dir, "deluge_qt", "data", "pixmaps")
+    print "Write flag_atlas.png and flag_atlas.txt (%d flags)" % len(flags)
+    atlas.save(os.path.join(pixmaps_dir, "flag_atlas.png"))
+    with open(os.path.join(pixmaps_dir, "flag_atlas.txt"), "wb") as f:
+        f.writelines(index)
+    print "All done"
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("-s", "--source-dir", dest="src_dir", metavar="DIR", default="..")
+    parser.add_option("--flags-dir", dest="flags_dir", metavar="DIR")
+    parser.add_option("--columns", dest="columns", type="int", default=16)
+    options, args = parser.parse_args()
+
+    pack_flags(options)
+
+
+if __name__ == "__main__":
+    main()